@@ -0,0 +1,101 @@
+import os
+import asyncio
+from typing import Dict, List, Optional
+
+ADMISSION_TIMEOUT_SECONDS = int(os.getenv("ADMISSION_TIMEOUT_SECONDS", "300"))
+
+# Outcomes a waiting peer can be woken with
+APPROVED = "approved"
+DENIED = "denied"
+
+
+class AdmissionQueue:
+    """Waiting room for one meeting.
+
+    Each waiting peer owns a Future that the admin's approve/deny resolves,
+    so waiters sleep instead of polling their socket. The dict keeps arrival
+    order for replaying requests to an admin that (re)connects.
+    """
+
+    def __init__(self):
+        self._waiting: Dict[str, asyncio.Future] = {}
+
+    def __len__(self):
+        return len(self._waiting)
+
+    def __contains__(self, peer_id: str):
+        return peer_id in self._waiting
+
+    def pending_ids(self) -> List[str]:
+        return list(self._waiting)
+
+    def request(self, peer_id: str) -> asyncio.Future:
+        future = self._waiting.get(peer_id)
+        if future is None or future.done():
+            future = asyncio.get_running_loop().create_future()
+            self._waiting[peer_id] = future
+        return future
+
+    def resolve(self, peer_id: str, outcome: str) -> bool:
+        future = self._waiting.pop(peer_id, None)
+        if future is None or future.done():
+            return False
+        future.set_result(outcome)
+        return True
+
+    def approve(self, peer_id: str) -> bool:
+        return self.resolve(peer_id, APPROVED)
+
+    def deny(self, peer_id: str) -> bool:
+        return self.resolve(peer_id, DENIED)
+
+    def resolve_many(self, peer_ids: Optional[List[str]], outcome: str) -> List[str]:
+        """Resolve the given peers, or everyone waiting when `peer_ids` is None."""
+        targets = self.pending_ids() if peer_ids is None else peer_ids
+        return [peer_id for peer_id in targets if self.resolve(peer_id, outcome)]
+
+    def cancel(self, peer_id: str) -> bool:
+        """Drop a peer that stopped waiting (disconnect or timeout)."""
+        future = self._waiting.pop(peer_id, None)
+        if future is None:
+            return False
+        future.cancel()
+        return True
+
+
+class AdmissionRegistry:
+    """Per-meeting admission queues; empty queues are dropped immediately."""
+
+    def __init__(self):
+        self.meetings: Dict[str, AdmissionQueue] = {}
+
+    def get(self, meeting_id: str) -> Optional[AdmissionQueue]:
+        return self.meetings.get(meeting_id)
+
+    def pending_ids(self, meeting_id: str) -> List[str]:
+        queue = self.meetings.get(meeting_id)
+        return queue.pending_ids() if queue else []
+
+    def request(self, meeting_id: str, peer_id: str) -> asyncio.Future:
+        return self.meetings.setdefault(meeting_id, AdmissionQueue()).request(peer_id)
+
+    def resolve_many(self, meeting_id: str, peer_ids: Optional[List[str]], outcome: str) -> List[str]:
+        queue = self.meetings.get(meeting_id)
+        if queue is None:
+            return []
+        resolved = queue.resolve_many(peer_ids, outcome)
+        self._discard_if_empty(meeting_id)
+        return resolved
+
+    def cancel(self, meeting_id: str, peer_id: str) -> bool:
+        queue = self.meetings.get(meeting_id)
+        if queue is None:
+            return False
+        cancelled = queue.cancel(peer_id)
+        self._discard_if_empty(meeting_id)
+        return cancelled
+
+    def _discard_if_empty(self, meeting_id: str):
+        queue = self.meetings.get(meeting_id)
+        if queue is not None and not len(queue):
+            del self.meetings[meeting_id]
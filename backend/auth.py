@@ -4,19 +4,32 @@ from pydantic import BaseModel, EmailStr
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from database import users_collection
+from database import get_users_collection
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from user_cache import user_cache
+from metrics import registry
+from ratelimit import limit_by_ip
 
 # ✅ Load Environment Variables
 SECRET_KEY = os.getenv("SECRET_KEY")  
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# bcrypt runs on this many threads; HASH_MAX_WAITING more callers may queue
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_MAX_WAITING = int(os.getenv("HASH_MAX_WAITING", "256"))
 
 # ✅ Initialize Router & Security
 router = APIRouter()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+hash_slots = asyncio.Semaphore(HASH_WORKERS)
+hash_pending = 0
+registry.gauge("auth_hash_jobs_pending", "bcrypt jobs running or queued for the pool.", lambda: hash_pending)
 
 # ✅ User Registration Model
 class UserRegister(BaseModel):
@@ -32,6 +45,26 @@ def hash_password(password: str):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+# ✅ Run bcrypt off the event loop; a login storm waits for a slot instead
+# of blocking every open WebSocket, and is shed once the queue is full
+async def run_hash_job(func, *args):
+    global hash_pending
+    if hash_pending >= HASH_WORKERS + HASH_MAX_WAITING:
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
+    hash_pending += 1
+    try:
+        async with hash_slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(hash_executor, func, *args)
+    finally:
+        hash_pending -= 1
+
+async def hash_password_async(password: str):
+    return await run_hash_job(hash_password, password)
+
+async def verify_password_async(plain_password, hashed_password):
+    return await run_hash_job(verify_password, plain_password, hashed_password)
+
 # ✅ Generate JWT Token
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -40,17 +73,9 @@ def create_access_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 # ✅ Register Route
-@router.post("/register")
+@router.post("/register", dependencies=[Depends(limit_by_ip("http:/register"))])
 async def register(user: UserRegister):
-    existing_user = await users_collection.find_one({"username": user.username})
-    existing_email = await users_collection.find_one({"email": user.email})
-
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Username already exists")
-    if existing_email:
-        raise HTTPException(status_code=400, detail="Email already exists")
-
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password_async(user.password)
     user_data = {
         "email": user.email,
         "username": user.username,
@@ -60,7 +85,13 @@ async def register(user: UserRegister):
 
     print("🔍 DEBUG: Inserting user into MongoDB →", user_data)
 
-    insert_result = await users_collection.insert_one(user_data)
+    # ✅ Unique indexes on username/email reject duplicates atomically
+    try:
+        insert_result = await get_users_collection().insert_one(user_data)
+    except DuplicateKeyError as e:
+        if "email" in (e.details or {}).get("keyPattern", {}):
+            raise HTTPException(status_code=400, detail="Email already exists")
+        raise HTTPException(status_code=400, detail="Username already exists")
     
     if insert_result.inserted_id:
         print("✅ SUCCESS: User inserted with ID:", insert_result.inserted_id)
@@ -70,15 +101,15 @@ async def register(user: UserRegister):
         raise HTTPException(status_code=500, detail="User registration failed")
 
 # ✅ Login Route
-@router.post("/token")
+@router.post("/token", dependencies=[Depends(limit_by_ip("http:/token"))])
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     identifier = form_data.username  # ✅ Can be username or email
 
-    user = await users_collection.find_one(
+    user = await get_users_collection().find_one(
         {"$or": [{"username": identifier}, {"email": identifier}]}
     )
 
-    if not user or not verify_password(form_data.password, user["password"]):
+    if not user or not await verify_password_async(form_data.password, user["password"]):
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
     # ✅ Store user ID in JWT for better retrieval
@@ -102,15 +133,22 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        user = await users_collection.find_one({"_id": ObjectId(user_id)})  # ✅ Fix here
+        # ✅ Serve repeat requests from the per-worker cache
+        cached_user = user_cache.get(user_id)
+        if cached_user:
+            return cached_user
+
+        user = await get_users_collection().find_one({"_id": ObjectId(user_id)})  # ✅ Fix here
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
 
-        return {
+        current_user = {
             "user_id": str(user["_id"]),
             "email": user["email"],
             "username": user["username"],
             "created_at": user.get("created_at"),
         }
+        user_cache.set(user_id, current_user, token_exp=payload.get("exp"))
+        return current_user
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
\ No newline at end of file
@@ -0,0 +1,127 @@
+import os
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+from fastapi import WebSocket
+from connection import PeerConnection
+from metrics import broadcast_seconds
+from protocol import Frame, JSON, COMPACT, PRESENCE_EVENTS, PRESENCE_BATCH_MS
+
+SIGNALING_BROKER = os.getenv("SIGNALING_BROKER", "memory")
+REPLACED_CLOSE_CODE = 4409  # Another socket joined with the same peer id
+
+
+class RoomBroker(ABC):
+    """Fans room events out to the peers connected to this process.
+
+    `publish` is the only way handlers reach other peers. The in-process
+    backend is the only one: admin election and the waiting room live in
+    signaling.py's module state, so signaling runs as a single process (see
+    `claim_single_worker`) and a cross-worker backend would have to share
+    those as well as fan-out. Each publish builds one
+    Frame, so every wire format is serialized once per event. Compact-mode
+    peers get presence events coalesced into a `roster-delta` frame every
+    PRESENCE_BATCH_MS; JSON peers keep receiving one frame per event.
+    """
+
+    def __init__(self):
+        self.rooms: Dict[str, Dict[str, PeerConnection]] = {}
+        self._presence: Dict[str, Dict[str, Tuple[str, str]]] = {}
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def join(self, meeting_id: str, peer_id: str, websocket: WebSocket, protocol: str = JSON) -> PeerConnection:
+        connection = PeerConnection(websocket, protocol=protocol)
+        connection.start()
+        room = self.rooms.setdefault(meeting_id, {})
+        previous = room.get(peer_id)
+        if previous is not None:
+            # Same peer reconnecting; don't leave the old writer running
+            previous.disconnect(REPLACED_CLOSE_CODE)
+        room[peer_id] = connection
+        return connection
+
+    async def leave(self, meeting_id: str, peer_id: str):
+        room = self.rooms.get(meeting_id)
+        if room is None:
+            return
+        connection = room.pop(peer_id, None)
+        if not room:
+            del self.rooms[meeting_id]
+        if connection is not None:
+            await connection.close()
+
+    def local_peers(self, meeting_id: str) -> Dict[str, PeerConnection]:
+        return self.rooms.get(meeting_id, {})
+
+    @abstractmethod
+    async def publish(self, meeting_id: str, message: dict, exclude: Optional[str] = None, to: Optional[str] = None):
+        """Deliver `message` to the room, everywhere it has peers."""
+
+    def deliver(self, meeting_id: str, frame: Frame, exclude: Optional[str] = None, to: Optional[str] = None):
+        """Queue `frame` on the matching peers connected to this worker."""
+        room = self.rooms.get(meeting_id)
+        if not room:
+            return
+        if to is not None:
+            if to in room:
+                room[to].send(frame)
+            return
+        batch_presence = PRESENCE_BATCH_MS > 0 and frame.type in PRESENCE_EVENTS
+        compact_waiting = False
+        for peer_id, connection in room.items():
+            if peer_id == exclude:
+                continue
+            if batch_presence and connection.protocol == COMPACT:
+                compact_waiting = True
+                continue
+            connection.send(frame)
+        if compact_waiting:
+            self._queue_presence(meeting_id, frame)
+
+    def _queue_presence(self, meeting_id: str, frame: Frame):
+        pending = self._presence.get(meeting_id)
+        if pending is None:
+            pending = self._presence[meeting_id] = {}
+            asyncio.get_running_loop().call_later(PRESENCE_BATCH_MS / 1000, self._flush_presence, meeting_id)
+        # Keep the first and latest event per peer: together they say whether
+        # the client knew the peer before the window and should at its end
+        peer_id = frame.message["peerId"]
+        first, _ = pending.get(peer_id, (frame.type, None))
+        pending[peer_id] = (first, frame.type)
+
+    def _flush_presence(self, meeting_id: str):
+        pending = self._presence.pop(meeting_id, None)
+        room = self.rooms.get(meeting_id)
+        if not pending or not room:
+            return
+        # Clients apply `left` before `joined`. A join then leave inside one
+        # window is dropped entirely; a leave then rejoin lists the peer in
+        # both, so the stale connection is torn down before the new one.
+        # Recipients may find their own peerId in `joined` and should skip it
+        joined = [peer_id for peer_id, (_, last) in pending.items() if last == "user-joined"]
+        left = [peer_id for peer_id, (first, _) in pending.items() if first == "user-left"]
+        if not joined and not left:
+            return
+        delta = Frame({"type": "roster-delta", "joined": joined, "left": left})
+        for connection in room.values():
+            if connection.protocol == COMPACT:
+                connection.send(delta)
+
+
+class InMemoryBroker(RoomBroker):
+    """Single-process backend: every peer lives in this worker."""
+
+    async def publish(self, meeting_id: str, message: dict, exclude: Optional[str] = None, to: Optional[str] = None):
+        with broadcast_seconds.time(message["type"]):
+            self.deliver(meeting_id, Frame(message), exclude=exclude, to=to)
+
+
+def create_broker(backend: str = SIGNALING_BROKER) -> RoomBroker:
+    if backend == "memory":
+        return InMemoryBroker()
+    raise ValueError(f"❌ ERROR: Unknown SIGNALING_BROKER `{backend}`")
@@ -0,0 +1,88 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, HTTPException, Depends, Query
+from database import get_chat_collection, get_meetings_collection
+from auth import get_current_user
+
+history_router = APIRouter()
+
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 200
+
+# Only what the chat pane renders; `_id` and `timestamp` back the cursor
+HISTORY_PROJECTION = {"_id": 1, "sender": 1, "message": 1, "timestamp": 1}
+
+
+def encode_cursor(timestamp: datetime, message_id: ObjectId) -> str:
+    raw = f"{timestamp.isoformat()}|{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        timestamp, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), ObjectId(message_id)
+    except (ValueError, InvalidId, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def fetch_history(meeting_id: str, before: Optional[str] = None, limit: int = HISTORY_DEFAULT_LIMIT) -> dict:
+    """Return one page of a meeting's chat, newest page first.
+
+    Pages walk backwards with a keyset on `(timestamp, _id)` so every page is
+    an index range scan on `(meeting_id, timestamp, _id)` regardless of how
+    deep the client has scrolled. Messages inside a page are oldest first.
+    """
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    query = {"meeting_id": meeting_id}
+    if before:
+        timestamp, message_id = decode_cursor(before)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": message_id}},
+        ]
+
+    cursor = get_chat_collection().find(query, HISTORY_PROJECTION).sort([("timestamp", -1), ("_id", -1)]).limit(limit + 1)
+    documents = await cursor.to_list(length=limit + 1)
+
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+    next_cursor = None
+    if has_more:
+        oldest = documents[-1]
+        next_cursor = encode_cursor(oldest["timestamp"], oldest["_id"])
+
+    messages = [
+        {
+            "id": str(doc["_id"]),
+            "sender": doc["sender"],
+            "message": doc["message"],
+            "timestamp": doc["timestamp"],
+        }
+        for doc in reversed(documents)
+    ]
+    return {"messages": messages, "nextCursor": next_cursor}
+
+
+async def is_participant(meeting_id: str, username: str) -> bool:
+    # ✅ The unique meeting_id index serves this; only `_id` comes back
+    meeting = await get_meetings_collection().find_one(
+        {"meeting_id": meeting_id, "participants": username}, {"_id": 1}
+    )
+    return meeting is not None
+
+
+@history_router.get("/meetings/{meeting_id}/messages")
+async def get_chat_history(
+    meeting_id: str,
+    before: Optional[str] = None,
+    limit: int = Query(HISTORY_DEFAULT_LIMIT, ge=1, le=HISTORY_MAX_LIMIT),
+    current_user: dict = Depends(get_current_user),
+):
+    # ✅ Only participants may read the chat
+    if not await is_participant(meeting_id, current_user["username"]):
+        raise HTTPException(status_code=404, detail="Meeting not found")
+    return await fetch_history(meeting_id, before=before, limit=limit)
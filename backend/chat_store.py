@@ -0,0 +1,132 @@
+import os
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, List, Optional
+from pymongo.errors import BulkWriteError, PyMongoError
+
+CHAT_FLUSH_BATCH_SIZE = int(os.getenv("CHAT_FLUSH_BATCH_SIZE", "100"))
+CHAT_FLUSH_INTERVAL_MS = int(os.getenv("CHAT_FLUSH_INTERVAL_MS", "200"))
+CHAT_BACKLOG_LIMIT = int(os.getenv("CHAT_BACKLOG_LIMIT", "10000"))
+
+logger = logging.getLogger(__name__)
+
+
+class ChatWriteBehind:
+    """Buffers chat messages and persists them with `insert_many`.
+
+    `get_collection` is resolved per flush, so the shared Mongo client is
+    only created inside the running app. Handlers call `enqueue` after
+    broadcasting; a background task flushes when `batch_size` messages are
+    waiting or `flush_interval` has passed.
+    The backlog is bounded: once full, the oldest unsaved message is dropped
+    and counted so a Mongo outage cannot exhaust memory.
+    """
+
+    def __init__(self, get_collection, batch_size: int = CHAT_FLUSH_BATCH_SIZE,
+                 flush_interval: float = CHAT_FLUSH_INTERVAL_MS / 1000, backlog_limit: int = CHAT_BACKLOG_LIMIT):
+        self.get_collection = get_collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backlog_limit = backlog_limit
+        self._buffer: Deque[dict] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._lock = asyncio.Lock()
+
+        self.enqueued = 0
+        self.persisted = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._buffer)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "enqueued": self.enqueued,
+            "persisted": self.persisted,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_seconds": self.last_flush_seconds,
+            "avg_flush_seconds": self.total_flush_seconds / self.flushes if self.flushes else 0.0,
+        }
+
+    async def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Let the flusher finish its current insert instead of cancelling it
+        # mid-batch, then write out whatever is left
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def enqueue(self, document: dict):
+        if len(self._buffer) >= self.backlog_limit:
+            self._buffer.popleft()
+            self.dropped += 1
+        self._buffer.append(document)
+        self.enqueued += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        async with self._lock:
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                started = time.perf_counter()
+                try:
+                    await self.get_collection().insert_many(batch, ordered=False)
+                except BulkWriteError as e:
+                    # Per-document errors will not go away on retry
+                    inserted = e.details.get("nInserted", 0)
+                    logger.error("❌ Error saving chat messages count=%d errors=%s", len(batch) - inserted, e.details.get("writeErrors"))
+                    self.failed_flushes += 1
+                    self.persisted += inserted
+                    self.dropped += len(batch) - inserted
+                    continue
+                except asyncio.CancelledError:
+                    # Cancelled mid-insert; keep the batch for the next flush
+                    self._requeue(batch)
+                    raise
+                except PyMongoError as e:
+                    logger.error("❌ Error saving chat messages count=%d error=%s", len(batch), e)
+                    self.failed_flushes += 1
+                    # Put the batch back in front and retry on the next tick
+                    self._requeue(batch)
+                    return
+                finally:
+                    elapsed = time.perf_counter() - started
+                    self.last_flush_seconds = elapsed
+                    self.total_flush_seconds += elapsed
+                    self.flushes += 1
+                self.persisted += len(batch)
+
+    def _requeue(self, batch: List[dict]):
+        self._buffer.extendleft(reversed(batch))
+        while len(self._buffer) > self.backlog_limit:
+            self._buffer.popleft()
+            self.dropped += 1
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
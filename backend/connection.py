@@ -0,0 +1,104 @@
+import os
+import asyncio
+import logging
+from typing import Optional, Set
+from fastapi import WebSocket
+from metrics import registry, Counter
+from protocol import Frame, JSON
+
+SEND_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", "256"))
+# "drop" discards the oldest queued frame, "disconnect" closes the socket
+SLOW_CONSUMER_POLICY = os.getenv("SLOW_CONSUMER_POLICY", "drop")
+SLOW_CONSUMER_CLOSE_CODE = 1013  # Try Again Later
+
+logger = logging.getLogger(__name__)
+# Close tasks outlive the connection objects that start them (the room drops
+# the peer right away), so hold them here until they finish
+_closing: Set[asyncio.Task] = set()
+frames_dropped = registry.register(Counter(
+    "signaling_frames_dropped_total", "Outbound frames discarded for slow consumers.", ("policy",)))
+
+
+class PeerConnection:
+    """A peer's socket plus a bounded outbound queue drained by its own task.
+
+    `send` never awaits, so a broadcast only pays for a queue append per
+    recipient and one stalled client cannot hold up the rest of the room.
+    """
+
+    def __init__(self, websocket: WebSocket, protocol: str = JSON, maxsize: int = SEND_QUEUE_SIZE, policy: str = SLOW_CONSUMER_POLICY):
+        if policy not in ("drop", "disconnect"):
+            raise ValueError(f"❌ ERROR: Unknown SLOW_CONSUMER_POLICY `{policy}`")
+        self.websocket = websocket
+        self.protocol = protocol
+        self.policy = policy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.closed = False
+        # Loop time of the last inbound frame; `heartbeat` once the client has ponged
+        self.last_seen = asyncio.get_running_loop().time()
+        self.heartbeat = False
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, frame: Frame) -> bool:
+        """Queue `frame` in this peer's wire format; returns False if it was not queued."""
+        if self.closed:
+            return False
+        payload = frame.encode(self.protocol)
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        self.dropped += 1
+        frames_dropped.inc(self.policy)
+        if self.policy == "disconnect":
+            logger.warning("⚠️ Disconnecting slow consumer queued=%d", self.queue.maxsize)
+            self.disconnect(SLOW_CONSUMER_CLOSE_CODE)
+            return False
+
+        self.queue.get_nowait()
+        self.queue.put_nowait(payload)
+        return True
+
+    async def close(self):
+        self.closed = True
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+
+    def disconnect(self, code: int):
+        """Stop sending and close the socket without waiting on the peer."""
+        self.closed = True
+        task = asyncio.create_task(self._close(code))
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+
+    async def _close(self, code: int):
+        await self.close()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _write_loop(self):
+        while True:
+            payload = await self.queue.get()
+            try:
+                if isinstance(payload, bytes):
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+            except Exception as e:
+                logger.info("❌ Send failed, dropping connection error=%s", e)
+                self.closed = True
+                return
@@ -1,43 +1,75 @@
 import os
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
+from metrics import MongoCommandMetrics
 
 # ✅ Load environment variables
 load_dotenv()
 
 MONGO_URI = os.getenv("DATABASE_URL")
+DATABASE_NAME = "video_call_db"
 
 if not MONGO_URI:
     raise ValueError("❌ ERROR: `DATABASE_URL` is missing from .env!")
 
-print("✅ DEBUG: Connecting to MongoDB at:", MONGO_URI)
+# ✅ Connection pool settings, shared by every router in this worker
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))  # 0 = no timeout
+# Comma-separated wire compressors, e.g. "zstd,snappy,zlib"; empty disables compression
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
 
-# ✅ Create global variables
-client = AsyncIOMotorClient(MONGO_URI)
-db = client["video_call_db"]
+client: Optional[AsyncIOMotorClient] = None
 
-users_collection = db["users"]
-meetings_collection = db["meetings"]
-chat_collection = db["chat_messages"]
 
-# ✅ Function to Initialize MongoDB
-def init_db():
-    global client, db, users_collection, meetings_collection
-    try:
-        client = AsyncIOMotorClient(MONGO_URI)
-        db = client["video_call_db"]
-        users_collection = db["users"]
-        meetings_collection = db["meetings"]
-        print("✅ DEBUG: MongoDB initialized successfully!")
-    except Exception as e:
-        print("❌ ERROR: MongoDB Initialization Failed:", e)
+# ✅ One Motor client per worker, created on first use
+def get_client() -> AsyncIOMotorClient:
+    global client
+    if client is None:
+        options = {
+            "maxPoolSize": MONGO_MAX_POOL_SIZE,
+            "minPoolSize": MONGO_MIN_POOL_SIZE,
+            "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+            "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+            "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS or None,
+            "event_listeners": [MongoCommandMetrics()],
+        }
+        if MONGO_COMPRESSORS:
+            options["compressors"] = MONGO_COMPRESSORS
+        client = AsyncIOMotorClient(MONGO_URI, **options)
+        print("✅ DEBUG: MongoDB client created")
+    return client
+
+
+# ✅ Called from the app lifespan on shutdown
+def close_client():
+    global client
+    if client is not None:
+        client.close()
+        client = None
+        print("✅ DEBUG: MongoDB client closed")
+
+
+def get_db():
+    return get_client()[DATABASE_NAME]
+
+
+def get_collection(name: str):
+    return get_db()[name]
+
+
+def get_users_collection():
+    return get_collection("users")
 
-# ✅ Call the function to initialize MongoDB
-init_db()
 
 def get_meetings_collection():
-    global meetings_collection
-    if meetings_collection is None:
-        print("⚠️ WARNING: `meetings_collection` is None. Reinitializing Database...")
-        init_db()
-    return meetings_collection
+    return get_collection("meetings")
+
+
+def get_chat_collection():
+    return get_collection("chat_messages")
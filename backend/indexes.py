@@ -0,0 +1,109 @@
+import os
+import sys
+import asyncio
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import PyMongoError
+from database import get_collection
+
+# "off" skips the plan audit, "warn" logs offenders, "strict" refuses to start
+INDEX_AUDIT = os.getenv("INDEX_AUDIT", "warn")
+
+USER_INDEXES = [
+    IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+]
+
+MEETING_INDEXES = [
+    IndexModel([("meeting_id", ASCENDING)], name="meeting_id_unique", unique=True),
+]
+
+# Keyset pages for chat history scan this index in either direction
+CHAT_INDEXES = [
+    IndexModel([("meeting_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)], name="meeting_timestamp_id"),
+]
+
+# Representative shapes of the queries issued by the auth, meeting and chat
+# history routes; the values only need to have the right types.
+HOT_QUERIES = [
+    ("auth.login", "users", {"$or": [{"username": "probe"}, {"email": "probe@example.com"}]}, None),
+    ("main.start_meeting/join_meeting", "meetings", {"meeting_id": "probe"}, None),
+    ("chat_history.get_chat_history", "meetings", {"meeting_id": "probe", "participants": "probe"}, None),
+    ("chat_history.fetch_history", "chat_messages", {"meeting_id": "probe"}, [("timestamp", -1), ("_id", -1)]),
+]
+
+
+class IndexAuditError(Exception):
+    pass
+
+
+async def ensure_indexes():
+    """Create the indexes the hot queries rely on; a no-op when they exist.
+
+    A unique index that cannot be built is fatal: the app does no duplicate
+    lookups of its own, so starting without it would accept duplicates.
+    """
+    for name, indexes in (
+        ("users", USER_INDEXES),
+        ("meetings", MEETING_INDEXES),
+        ("chat_messages", CHAT_INDEXES),
+    ):
+        collection = get_collection(name)
+        try:
+            await collection.create_indexes(indexes)
+        except PyMongoError as e:
+            # Most likely existing duplicates blocking a unique index
+            print(f"❌ ERROR: Index creation failed on `{collection.name}`:", e)
+            # register/start-meeting rely on unique indexes alone to reject duplicates
+            if any(index.document.get("unique") for index in indexes):
+                raise IndexAuditError(f"Unique index build failed on `{collection.name}`: {e}") from e
+    print("✅ DEBUG: MongoDB indexes ensured")
+
+
+def _plan_stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _plan_stages(value)
+
+
+async def audit_query_plans() -> list:
+    """Explain every hot query and return the ones that fall back to a COLLSCAN."""
+    offenders = []
+    for name, collection_name, query, sort in HOT_QUERIES:
+        collection = get_collection(collection_name)
+        cursor = collection.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = set(_plan_stages(explain["queryPlanner"]["winningPlan"]))
+        if "COLLSCAN" in stages:
+            offenders.append(f"{name}: {collection.name}.find({query}) uses a collection scan")
+    return offenders
+
+
+async def bootstrap_indexes(audit: str = INDEX_AUDIT):
+    """Lifespan entry point: ensure indexes, then audit the hot query plans."""
+    await ensure_indexes()
+    if audit == "off":
+        return
+    try:
+        offenders = await audit_query_plans()
+    except PyMongoError as e:
+        print("❌ ERROR: Query plan audit failed:", e)
+        return
+    for offender in offenders:
+        print("⚠️ WARNING:", offender)
+    if offenders and audit == "strict":
+        raise IndexAuditError("; ".join(offenders))
+
+
+if __name__ == "__main__":
+    # `python indexes.py` exits non-zero when a hot query is unindexed
+    try:
+        asyncio.run(bootstrap_indexes(audit="strict"))
+    except IndexAuditError:
+        sys.exit(1)
@@ -0,0 +1,812 @@
+"""Load test and latency benchmark for the signaling server.
+
+Starts the app in a child process with an in-memory Mongo stand-in, drives
+it over loopback, and prints latency/throughput figures. Nothing leaves the
+machine and no database is needed. All simulated peers share one client
+process, so for large rooms with no --interval the client, not the server,
+becomes the bottleneck and inflates fan-out latency.
+
+    python loadtest.py signaling --meetings 10 --peers 10 --messages 20
+    python loadtest.py login-burst --logins 50
+    python loadtest.py joins --users 50 --joins 500
+    python loadtest.py protocol --room 50 --storm 100
+    python loadtest.py flood --peers 10 --frames 5000
+    python loadtest.py soak --cycles 5000 --peers 3
+
+Every simulated client shares the loopback address, so the server runs with
+rate limits lifted unless a scenario (like `flood`) asks for them.
+"""
+import gc
+import os
+import sys
+import time
+import uuid
+import asyncio
+import json
+import timeit
+import tempfile
+import argparse
+import subprocess
+from copy import deepcopy
+from typing import Dict, List, Optional
+
+import httpx
+import orjson
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from websockets.asyncio.client import connect
+
+from protocol import COMPACT, JSON, Frame, decode, encode_compact
+
+UNLIMITED = ";".join(f"{policy}=1e9:1e9" for policy in (
+    "ws:connect", "ws:chat-message", "http:/token", "http:/register", "http:/join-meeting"))
+# Sender of the `flood` scenario's junk frames, left out of latency samples
+ABUSER = "abuser"
+
+
+# ---------------------------------------------------------------------------
+# In-memory Mongo stand-in (server side)
+# ---------------------------------------------------------------------------
+
+def _get_field(document: dict, path: str):
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _matches(document: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(document, sub) for sub in condition):
+                return False
+            continue
+        value = _get_field(document, key)
+        if isinstance(condition, dict) and any(op.startswith("$") for op in condition):
+            for op, operand in condition.items():
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$gt" and not (value is not None and value > operand):
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+        elif value != condition and not (isinstance(value, list) and condition in value):
+            return False
+    return True
+
+
+class StubCursor:
+    def __init__(self, documents: List[dict], projection: Optional[dict]):
+        self._documents = documents
+        self._projection = projection
+        self._limit = 0
+
+    def sort(self, keys):
+        for key, direction in reversed(keys):
+            self._documents.sort(key=lambda doc: _get_field(doc, key), reverse=direction < 0)
+        return self
+
+    def limit(self, limit: int):
+        self._limit = limit
+        return self
+
+    async def to_list(self, length: Optional[int] = None):
+        documents = self._documents[:self._limit] if self._limit else self._documents
+        if self._projection:
+            fields = [key for key, include in self._projection.items() if include]
+            documents = [{key: doc[key] for key in fields if key in doc} for doc in documents]
+        return [deepcopy(doc) for doc in documents]
+
+
+# Simulated one-way network delay of the stand-in's calls, in seconds
+STUB_LATENCY = float(os.getenv("LOADTEST_MONGO_LATENCY_MS", "1")) / 1000
+
+
+async def _round_trip():
+    # Every call waits as if it had gone over the network, so concurrent
+    # requests interleave between a read and a later write exactly where
+    # they would against a real server.
+    await asyncio.sleep(STUB_LATENCY)
+
+
+class StubCollection:
+    """Just enough of Motor's collection API for the routes under test.
+
+    Each operation is atomic in itself but yields before and after it runs.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.documents: List[dict] = []
+        self.unique_keys: List[str] = []
+
+    async def create_index(self, keys, **kwargs):
+        pass
+
+    async def create_indexes(self, indexes):
+        for index in indexes:
+            spec = index.document
+            if spec.get("unique"):
+                self.unique_keys.append(next(iter(spec["key"])))
+
+    def _check_unique(self, document: dict):
+        for key in self.unique_keys:
+            value = document.get(key)
+            if any(existing.get(key) == value for existing in self.documents):
+                raise DuplicateKeyError(f"E11000 duplicate key: {key}", details={"keyPattern": {key: 1}})
+
+    def _insert(self, document: dict):
+        document.setdefault("_id", ObjectId())
+        self._check_unique(document)
+        self.documents.append(deepcopy(document))
+
+    async def insert_one(self, document: dict):
+        await _round_trip()
+        self._insert(document)
+        await _round_trip()
+        return type("InsertOneResult", (), {"inserted_id": document["_id"]})()
+
+    async def insert_many(self, documents: List[dict], ordered: bool = True):
+        await _round_trip()
+        for document in documents:
+            self._insert(document)
+        await _round_trip()
+
+    async def find_one(self, query: dict, projection: Optional[dict] = None):
+        await _round_trip()
+        found = next((deepcopy(document) for document in self.documents if _matches(document, query)), None)
+        await _round_trip()
+        return found
+
+    def find(self, query: dict, projection: Optional[dict] = None):
+        return StubCursor([doc for doc in self.documents if _matches(doc, query)], projection)
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False):
+        await _round_trip()
+        result = self._update(query, update, upsert)
+        await _round_trip()
+        return result
+
+    def _update(self, query: dict, update: dict, upsert: bool):
+        result = type("UpdateResult", (), {"matched_count": 0, "upserted_id": None})()
+        for document in self.documents:
+            if _matches(document, query):
+                result.matched_count = 1
+                for key, value in update.get("$set", {}).items():
+                    document[key] = value
+                for key, value in update.get("$push", {}).items():
+                    document.setdefault(key, []).append(value)
+                for key, value in update.get("$addToSet", {}).items():
+                    if value not in document.setdefault(key, []):
+                        document[key].append(value)
+                return result
+        if upsert:
+            document = {**query, **update.get("$setOnInsert", {}), **update.get("$set", {})}
+            self._insert(document)
+            result.upserted_id = document["_id"]
+        return result
+
+
+class StubDatabase:
+    def __init__(self):
+        self.collections: Dict[str, StubCollection] = {}
+
+    def __getitem__(self, name: str) -> StubCollection:
+        return self.collections.setdefault(name, StubCollection(name))
+
+
+class StubClient:
+    def __init__(self):
+        self.databases: Dict[str, StubDatabase] = {}
+
+    def __getitem__(self, name: str) -> StubDatabase:
+        return self.databases.setdefault(name, StubDatabase())
+
+    def close(self):
+        pass
+
+
+def serve(port: int):
+    """Child process: run the real app on top of the in-memory stand-in."""
+    os.environ["DATABASE_URL"] = "mongodb://loadtest.invalid"
+    os.environ.setdefault("SECRET_KEY", "loadtest")
+    os.environ.setdefault("INDEX_AUDIT", "off")
+    # One lock per port so scenarios on different ports can run side by side
+    os.environ.setdefault("SIGNALING_LOCK_FILE", os.path.join(tempfile.gettempdir(), f"signaling-loadtest-{port}.lock"))
+    os.environ.setdefault("RATE_LIMITS", UNLIMITED)
+    os.environ.setdefault("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+    import uvicorn
+    import database
+    database.client = StubClient()
+
+    import main
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # Live allocator blocks after a full collection, for the `soak` leak
+    # check; unlike gc.get_objects() this also sees strings and the atomic
+    # dicts the collector does not track
+    @main.app.get("/__loadtest__/heap")
+    async def loadtest_heap():
+        gc.collect()
+        return {"blocks": sys.getallocatedblocks()}
+
+    # Lets the `joins` scenario start from a meeting that is already large
+    @main.app.post("/__loadtest__/meetings/{meeting_id}/seed")
+    async def loadtest_seed(meeting_id: str, count: int):
+        meetings = database.get_meetings_collection()
+        meeting = next(doc for doc in meetings.documents if doc["meeting_id"] == meeting_id)
+        meeting["participants"].extend(f"seed{i}" for i in range(count))
+        return {"participants": len(meeting["participants"])}
+
+    # Lets the `joins` scenario inspect what actually got stored
+    @main.app.get("/__loadtest__/meetings/{meeting_id}")
+    async def loadtest_meeting(meeting_id: str):
+        meeting = await database.get_meetings_collection().find_one({"meeting_id": meeting_id})
+        return {"participants": meeting["participants"] if meeting else []}
+
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning", ws_max_size=1 << 20)
+
+
+# ---------------------------------------------------------------------------
+# Client side
+# ---------------------------------------------------------------------------
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def format_ms(samples: List[float]) -> str:
+    return (f"p50 {percentile(samples, 50) * 1000:7.2f} ms  p99 {percentile(samples, 99) * 1000:7.2f} ms  "
+            f"max {max(samples, default=0) * 1000:7.2f} ms  (n={len(samples)})")
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+class Server:
+    def __init__(self, port: int, env: Optional[Dict[str, str]] = None):
+        self.port = port
+        self.env = env
+        self.http_url = f"http://127.0.0.1:{port}"
+        self.ws_url = f"ws://127.0.0.1:{port}"
+        self.process: Optional[subprocess.Popen] = None
+
+    async def __aenter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--port", str(self.port), "serve"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env={**os.environ, **(self.env or {})},
+        )
+        async with httpx.AsyncClient() as client:
+            for _ in range(200):
+                try:
+                    await client.get(self.http_url + "/")
+                    return self
+                except httpx.TransportError:
+                    await asyncio.sleep(0.05)
+        raise RuntimeError("server did not start")
+
+    async def __aexit__(self, *exc):
+        self.process.terminate()
+        self.process.wait()
+
+    @property
+    def rss(self) -> int:
+        return rss_bytes(self.process.pid)
+
+    @property
+    def cpu(self) -> float:
+        return cpu_seconds(self.process.pid)
+
+
+class Stats:
+    def __init__(self):
+        self.connect: List[float] = []
+        self.fanout: List[float] = []
+        self.sent = 0
+        self.received = 0
+
+    def reset_traffic(self):
+        self.fanout.clear()
+        self.sent = 0
+        self.received = 0
+
+
+class Peer:
+    def __init__(self, server: Server, meeting_id: str, peer_id: str, is_admin: bool, stats: Stats, protocol: str = JSON, answers_pings: bool = True):
+        self.server = server
+        self.meeting_id = meeting_id
+        self.peer_id = peer_id
+        self.is_admin = is_admin
+        self.stats = stats
+        self.protocol = protocol
+        self.admitted = asyncio.Event()
+        self.frames_in = 0
+        self.bytes_in = 0
+        self.rate_limited = 0
+        self.answers_pings = answers_pings
+        self.ws = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        started = time.perf_counter()
+        url = f"{self.server.ws_url}/ws/{self.meeting_id}/{self.peer_id}?protocol={self.protocol}"
+        self.ws = await connect(url, max_size=None)
+        self._reader = asyncio.create_task(self._read())
+        if self.is_admin:
+            self.admitted.set()
+        await self.admitted.wait()
+        self.stats.connect.append(time.perf_counter() - started)
+
+    async def _read(self):
+        try:
+            async for raw in self.ws:
+                self.frames_in += 1
+                self.bytes_in += len(raw)
+                self.handle(decode(raw, self.protocol), time.perf_counter())
+        except Exception:
+            pass
+
+    def handle(self, data: dict, received_at: float):
+        kind = data.get("type")
+        if kind == "chat-message":
+            if data["sender"] not in (self.peer_id, ABUSER):
+                self.stats.received += 1
+                self.stats.fanout.append(received_at - float(data["message"]))
+        elif kind == "approval-request" and self.is_admin:
+            asyncio.create_task(self.send({"type": "approved", "peerId": data["peerId"]}))
+        elif kind == "approved":
+            self.admitted.set()
+        elif kind == "rate-limited":
+            self.rate_limited += 1
+        elif kind == "ping" and self.answers_pings:
+            asyncio.create_task(self.send({"type": "pong"}))
+
+    async def send(self, data: dict):
+        await self.ws.send(encode_compact(data) if self.protocol == COMPACT else orjson.dumps(data).decode())
+
+    async def chat(self, count: int, interval: float = 0.0):
+        for _ in range(count):
+            await self.send({"type": "chat-message", "sender": self.peer_id, "message": f"{time.perf_counter():.9f}"})
+            self.stats.sent += 1
+            await asyncio.sleep(interval)
+
+    async def close(self):
+        await self.ws.close()
+        if self._reader is not None:
+            await self._reader
+
+
+async def open_meetings(server: Server, meetings: int, peers: int, stats: Stats) -> List[List[Peer]]:
+    rooms = []
+    for m in range(meetings):
+        meeting_id = f"load-{m}-{uuid.uuid4().hex[:6]}"
+        room = [Peer(server, meeting_id, f"p{i}", i == 0, stats) for i in range(peers)]
+        await room[0].connect()
+        await asyncio.gather(*(peer.connect() for peer in room[1:]))
+        rooms.append(room)
+    return rooms
+
+
+async def wait_for_deliveries(stats: Stats, expected: int, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while stats.received < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def run_signaling(args):
+    stats = Stats()
+    async with Server(args.port) as server:
+        await asyncio.sleep(0.2)
+        baseline_rss = server.rss
+        rooms = await open_meetings(server, args.meetings, args.peers, stats)
+        connections = args.meetings * args.peers
+        connected_rss = server.rss
+
+        expected = args.meetings * args.peers * args.messages * (args.peers - 1)
+        started = time.perf_counter()
+        await asyncio.gather(*(peer.chat(args.messages, interval=args.interval) for room in rooms for peer in room))
+        await wait_for_deliveries(stats, expected, args.timeout)
+        elapsed = time.perf_counter() - started
+
+        await asyncio.gather(*(peer.close() for room in rooms for peer in room))
+
+    print(f"meetings x peers      {args.meetings} x {args.peers} = {connections} connections")
+    print(f"connect (to admitted) {format_ms(stats.connect)}")
+    print(f"broadcast fan-out     {format_ms(stats.fanout)}")
+    print(f"chat sent             {stats.sent} in {elapsed:.2f} s ({stats.sent / elapsed:,.0f} msg/s)")
+    print(f"deliveries            {stats.received}/{expected} ({stats.received / elapsed:,.0f} msg/s)")
+    print(f"memory per connection {(connected_rss - baseline_rss) / connections / 1024:,.1f} KiB")
+
+
+async def register_users(client: httpx.AsyncClient, count: int) -> List[str]:
+    async def one(i):
+        username = f"load{i}_{uuid.uuid4().hex[:6]}"
+        await client.post("/register", json={"email": f"{username}@example.com", "username": username, "password": "loadtest"})
+        response = await client.post("/token", data={"username": username, "password": "loadtest"})
+        return response.json()["access_token"]
+    return await asyncio.gather(*(one(i) for i in range(count)))
+
+
+async def run_login_burst(args):
+    """Chat latency in a live meeting, first quiet, then during a login storm."""
+    stats = Stats()
+    async with Server(args.port) as server:
+        async with httpx.AsyncClient(base_url=server.http_url, timeout=120) as client:
+            username = f"burst_{uuid.uuid4().hex[:6]}"
+            await client.post("/register", json={"email": f"{username}@example.com", "username": username, "password": "loadtest"})
+            rooms = await open_meetings(server, args.meetings, args.peers, stats)
+            peers = [peer for room in rooms for peer in room]
+
+            async def chat_phase():
+                await asyncio.gather(*(peer.chat(args.messages, interval=args.interval) for peer in peers))
+                await wait_for_deliveries(stats, stats.sent * (args.peers - 1), args.timeout)
+
+            await chat_phase()
+            quiet = list(stats.fanout)
+            stats.reset_traffic()
+
+            login_latency: List[float] = []
+
+            async def login():
+                started = time.perf_counter()
+                response = await client.post("/token", data={"username": username, "password": "loadtest"})
+                login_latency.append(time.perf_counter() - started)
+                return response.status_code
+
+            results = await asyncio.gather(chat_phase(), *(login() for _ in range(args.logins)))
+            burst = list(stats.fanout)
+            await asyncio.gather(*(peer.close() for peer in peers))
+
+    statuses = {code: results[1:].count(code) for code in set(results[1:])}
+    print(f"chat fan-out, quiet   {format_ms(quiet)}")
+    print(f"chat fan-out, burst   {format_ms(burst)}")
+    print(f"logins                {args.logins} concurrent, statuses {statuses}")
+    print(f"login latency         {format_ms(login_latency)}")
+
+
+async def run_joins(args):
+    """Hundreds of simultaneous /join-meeting calls, into a small meeting and a large one.
+
+    Both rounds send the same --joins requests from the same --users at the
+    same concurrency; the second meeting starts with --seed participants
+    already stored. Fails if a participant is stored twice, or if joins into
+    the large meeting cost more than --max-slowdown times those into the
+    small one (i.e. a join must not read or rewrite the participants array).
+    """
+    async with Server(args.port) as server:
+        async with httpx.AsyncClient(base_url=server.http_url, timeout=120,
+                                     limits=httpx.Limits(max_connections=args.joins)) as client:
+            tokens = await register_users(client, args.users)
+
+            async def join_round(seed: int):
+                meeting_id = f"joins-{uuid.uuid4().hex[:6]}"
+                body = {"meeting_id": meeting_id, "username": "loadtest"}
+                await client.post("/start-meeting", json=body, headers={"Authorization": f"Bearer {tokens[0]}"})
+                await client.post(f"/__loadtest__/meetings/{meeting_id}/seed", params={"count": seed})
+                latency: List[float] = []
+
+                async def join(i):
+                    # Each user's joins go out back to back, where a read-then-write would race
+                    token = tokens[i * len(tokens) // args.joins]
+                    started = time.perf_counter()
+                    response = await client.post("/join-meeting", json=body, headers={"Authorization": f"Bearer {token}"})
+                    latency.append(time.perf_counter() - started)
+                    return response.status_code
+
+                started, server_cpu, client_cpu = time.perf_counter(), server.cpu, time.process_time()
+                statuses = await asyncio.gather(*(join(i) for i in range(args.joins)))
+                elapsed = time.perf_counter() - started
+                cpu = ((server.cpu - server_cpu) / args.joins, (time.process_time() - client_cpu) / args.joins)
+                participants = (await client.get(f"/__loadtest__/meetings/{meeting_id}")).json()["participants"]
+                joined = [name for name in participants if not name.startswith("seed")]
+                return set(statuses), latency, elapsed / args.joins, cpu, joined
+
+            rounds = [(seed, *await join_round(seed)) for seed in (0, args.seed)]
+
+    print(f"joins                 {args.joins} concurrent from {args.users} users per round")
+    # httpx spends more CPU per request than the server does, so absolute
+    # latency here is mostly client-side queueing; compare the two rounds
+    for seed, statuses, latency, cost, (server_cpu, client_cpu), joined in rounds:
+        print(f"meeting of {seed:>6} + {len(joined)} joined, statuses {statuses}")
+        print(f"  join latency        {format_ms(latency)}")
+        print(f"  per-join cost       {cost * 1000:.2f} ms wall, cpu {server_cpu * 1000:.2f} ms server "
+              f"/ {client_cpu * 1000:.2f} ms client")
+    small, large = rounds
+    slowdown = percentile(large[2], 50) / percentile(small[2], 50)
+    print(f"p50 slowdown          {slowdown:.2f}x at {args.seed} existing participants")
+    expected = min(args.users, args.joins)  # Every user gets at least one join
+    for seed, *_, joined in rounds:
+        if len(joined) != len(set(joined)) or len(joined) != expected:
+            print(f"FAIL: duplicate or missing participants in the meeting of {seed}")
+            sys.exit(1)
+    if slowdown > args.max_slowdown:
+        print(f"FAIL: joins got {slowdown:.1f}x slower in the large meeting (limit {args.max_slowdown}x)")
+        sys.exit(1)
+
+
+def bench_encoding(room: int):
+    """Bytes per event and serialization CPU per broadcast, old path vs new."""
+    events = {
+        "chat-message": {"type": "chat-message", "sender": "alice", "message": "Can everyone see my screen?"},
+        "user-joined": {"type": "user-joined", "peerId": "k3j9x2a"},
+        "chat-history(50)": {"type": "chat-history", "nextCursor": "MjAyNi0wMS0wMVQwMDowMDowMHw2NTAw",
+                             "messages": [{"id": "650000000000000000000000", "sender": "alice",
+                                           "message": "message body", "timestamp": "2026-01-01T00:00:00"}] * 50},
+    }
+    print(f"{'event':18} {'json B':>8} {'compact B':>10}   per broadcast to {room} peers")
+    for name, message in events.items():
+        json_bytes = len(orjson.dumps(message))
+        compact_bytes = len(encode_compact(message))
+        runs = 2000
+        # Old path: starlette's send_json ran json.dumps once per recipient
+        per_recipient = timeit.timeit(lambda: [json.dumps(message, separators=(",", ":")) for _ in range(room)], number=runs) / runs
+        once_json = timeit.timeit(lambda: Frame(message).json(), number=runs) / runs
+        once_compact = timeit.timeit(lambda: Frame(message).compact(), number=runs) / runs
+        print(f"{name:18} {json_bytes:8} {compact_bytes:10}   json.dumps x{room} {per_recipient * 1e6:8.1f} us   "
+              f"orjson once {once_json * 1e6:6.1f} us   compact once {once_compact * 1e6:6.1f} us")
+
+
+async def run_presence_storm(server: Server, protocol: str, storm: int) -> Peer:
+    """An observer watches `storm` peers join and leave; returns the observer."""
+    stats = Stats()
+    meeting_id = f"storm-{uuid.uuid4().hex[:6]}"
+    admin = Peer(server, meeting_id, "admin", True, stats)
+    await admin.connect()
+    observer = Peer(server, meeting_id, "observer", False, stats, protocol=protocol)
+    await observer.connect()
+    frames_before, bytes_before = observer.frames_in, observer.bytes_in
+
+    crowd = [Peer(server, meeting_id, f"s{i}", False, stats) for i in range(storm)]
+    await asyncio.gather(*(peer.connect() for peer in crowd))
+    await asyncio.gather(*(peer.close() for peer in crowd))
+    await asyncio.sleep(0.5)
+
+    observer.frames_in -= frames_before
+    observer.bytes_in -= bytes_before
+    await observer.close()
+    await admin.close()
+    return observer
+
+
+async def run_protocol(args):
+    bench_encoding(args.room)
+    async with Server(args.port) as server:
+        print(f"\npresence storm: {args.storm} peers join then leave, seen by one observer")
+        for protocol in (JSON, COMPACT):
+            observer = await run_presence_storm(server, protocol, args.storm)
+            print(f"  {protocol:8} {observer.frames_in:6} frames {observer.bytes_in:8} bytes")
+
+
+async def run_flood_round(server: Server, args) -> dict:
+    """One meeting chats politely while one member floods it with chat frames."""
+    stats = Stats()
+    meeting_id = f"flood-{uuid.uuid4().hex[:6]}"
+    room = [Peer(server, meeting_id, f"p{i}", i == 0, stats) for i in range(args.peers)]
+    await room[0].connect()
+    await asyncio.gather(*(peer.connect() for peer in room[1:]))
+    abuser = Peer(server, meeting_id, ABUSER, False, Stats())
+    await abuser.connect()
+
+    async def polite_phase():
+        sent_before = stats.sent
+        await asyncio.gather(*(peer.chat(args.messages, interval=args.interval) for peer in room))
+        await wait_for_deliveries(stats, stats.received + (stats.sent - sent_before) * (args.peers - 1), args.timeout)
+
+    await polite_phase()
+    quiet = list(stats.fanout)
+    stats.reset_traffic()
+
+    async def flood():
+        try:
+            for _ in range(args.frames):
+                await abuser.send({"type": "chat-message", "sender": ABUSER, "message": "spam"})
+        except Exception:
+            pass  # Disconnected by the server
+
+    await asyncio.gather(polite_phase(), flood())
+    flooded = list(stats.fanout)
+    await asyncio.sleep(0.2)
+    result = {"quiet": quiet, "flooded": flooded, "rate_limited": abuser.rate_limited,
+              "close_code": abuser.ws.close_code}
+    await asyncio.gather(*(peer.close() for peer in room), abuser.close())
+    return result
+
+
+async def run_flood(args):
+    """Polite-room fan-out latency while one peer floods, with and without limits."""
+    for label, limits in (("unlimited", UNLIMITED), ("limited", "ws:connect=1e9:1e9")):
+        async with Server(args.port, env={"RATE_LIMITS": limits}) as server:
+            result = await run_flood_round(server, args)
+        print(f"{label}: {args.frames} abuser frames into a room of {args.peers}")
+        print(f"  fan-out, quiet      {format_ms(result['quiet'])}")
+        print(f"  fan-out, flooded    {format_ms(result['flooded'])}")
+        print(f"  abuser              {result['rate_limited']} rate-limited replies, close code {result['close_code']}")
+
+
+async def read_metrics(server: Server) -> Dict[str, float]:
+    async with httpx.AsyncClient(base_url=server.http_url) as client:
+        text = (await client.get("/metrics")).text
+    values: Dict[str, float] = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            name = name.split("{")[0]  # Sum labelled series
+            values[name] = values.get(name, 0.0) + float(value)
+    return values
+
+
+async def soak_lifecycle(server: Server, index: int, peers: int, ghost: bool):
+    """Open a meeting, admit everyone, then empty it with the admin leaving first.
+
+    A ghost peer pongs once and then goes silent without closing, like a
+    half-open socket; the server has to reap it on its own.
+    """
+    stats = Stats()
+    meeting_id = f"soak-{index}-{uuid.uuid4().hex[:6]}"
+    room = [Peer(server, meeting_id, f"p{i}", i == 0, stats, answers_pings=not (ghost and i == peers - 1))
+            for i in range(peers)]
+    await room[0].connect()
+    await asyncio.gather(*(peer.connect() for peer in room[1:]))
+    if ghost:
+        await room[-1].send({"type": "pong"})
+
+    await room[0].close()
+    await asyncio.gather(*(peer.close() for peer in room[1:] if peer.answers_pings))
+    return room[-1] if ghost else None
+
+
+async def read_heap(server: Server) -> int:
+    async with httpx.AsyncClient(base_url=server.http_url) as client:
+        return (await client.get("/__loadtest__/heap")).json()["blocks"]
+
+
+async def run_soak(args):
+    """Thousands of meeting lifecycles; per-meeting state and the server heap must stay flat.
+
+    RSS is reported but not gated: it climbs for a while as zlib and the
+    allocator grow their pools, by an amount that depends on how long the
+    run is. The gate is the number of live Python allocator blocks in the
+    server, taken after --warmup cycles and again at the end, both once the
+    reaper has drained the ghosts. Anything kept per meeting grows it by at
+    least one block per cycle.
+    """
+    env = {"HEARTBEAT_INTERVAL_SECONDS": str(args.heartbeat), "HEARTBEAT_TIMEOUT_SECONDS": str(args.heartbeat * 3)}
+    warmup = min(args.warmup, args.cycles // 2)
+    checkpoints = max(1, args.cycles // 10)
+    ghosts = []
+    async with Server(args.port, env=env) as server:
+        await asyncio.sleep(0.2)
+        print(f"{'cycles':>8} {'rss MiB':>9} {'meetings':>9} {'peers':>6} {'admins':>7} {'waiting':>8}")
+
+        async def drain():
+            # Give the reaper time to find the ghosts still holding sockets open
+            await asyncio.sleep(args.heartbeat * 5)
+            return await read_heap(server)
+
+        if not warmup:
+            warm_blocks, warm_rss = await read_heap(server), server.rss
+        # Batches break at `warmup` so the baseline is taken exactly there
+        bounds = [*range(0, warmup, args.concurrency), *range(warmup, args.cycles, args.concurrency), args.cycles]
+        started = time.perf_counter()
+        for first, last in zip(bounds, bounds[1:]):
+            batch = range(first, last)
+            ghosts += [g for g in await asyncio.gather(*(
+                soak_lifecycle(server, i, args.peers, args.ghost_every > 0 and i % args.ghost_every == 0)
+                for i in batch)) if g is not None]
+            done = batch[-1] + 1
+            if done == warmup:
+                warm_blocks, warm_rss = await drain(), server.rss
+            if done % checkpoints < args.concurrency or done == args.cycles:
+                metrics = await read_metrics(server)
+                print(f"{done:8} {server.rss / 2 ** 20:9.1f} {metrics['signaling_active_meetings']:9.0f} "
+                      f"{metrics['signaling_active_peers']:6.0f} {metrics['signaling_tracked_meetings']:7.0f} "
+                      f"{metrics['signaling_pending_admissions']:8.0f}")
+        elapsed = time.perf_counter() - started
+
+        final_blocks = await drain()
+        metrics = await read_metrics(server)
+        final_rss = server.rss
+        await asyncio.gather(*(ghost.close() for ghost in ghosts))
+
+    leftover = {name: metrics[name] for name in ("signaling_active_meetings", "signaling_active_peers",
+                                                 "signaling_tracked_meetings", "signaling_pending_admissions")}
+    per_cycle = (final_blocks - warm_blocks) / max(1, args.cycles - warmup)
+    print(f"lifecycles            {args.cycles} x {args.peers} peers in {elapsed:.1f} s, {len(ghosts)} ghosts")
+    print(f"peers reaped          {metrics.get('signaling_peers_reaped_total', 0):.0f}")
+    print(f"state after drain     {leftover}")
+    print(f"allocated blocks      {warm_blocks} after {warmup} cycles -> {final_blocks} "
+          f"({per_cycle:+.3f} per cycle)")
+    print(f"rss                   {warm_rss / 2 ** 20:.1f} -> {final_rss / 2 ** 20:.1f} MiB (not gated)")
+    if any(leftover.values()):
+        print("FAIL: per-meeting state left behind")
+        sys.exit(1)
+    if per_cycle > args.max_blocks_per_cycle:
+        print(f"FAIL: server heap grew {per_cycle:.3f} blocks per cycle (limit {args.max_blocks_per_cycle})")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for outstanding deliveries")
+    scenarios = parser.add_subparsers(dest="scenario", required=True)
+
+    signaling = scenarios.add_parser("signaling", help="join, approval, chat burst and disconnect")
+    signaling.add_argument("--meetings", type=int, default=10)
+    signaling.add_argument("--peers", type=int, default=10)
+    signaling.add_argument("--messages", type=int, default=20, help="chat messages sent by each peer")
+    signaling.add_argument("--interval", type=float, default=0.0, help="seconds between a peer's messages")
+
+    burst = scenarios.add_parser("login-burst", help="chat latency during concurrent logins")
+    burst.add_argument("--meetings", type=int, default=2)
+    burst.add_argument("--peers", type=int, default=5)
+    burst.add_argument("--messages", type=int, default=40)
+    burst.add_argument("--interval", type=float, default=0.05)
+    burst.add_argument("--logins", type=int, default=40)
+
+    joins = scenarios.add_parser("joins", help="concurrent /join-meeting against one meeting")
+    joins.add_argument("--users", type=int, default=50)
+    joins.add_argument("--joins", type=int, default=500)
+    joins.add_argument("--seed", type=int, default=20000, help="participants already in the large meeting")
+    joins.add_argument("--max-slowdown", type=float, default=2.0, help="allowed p50 growth from the small meeting to the large one")
+
+    wire = scenarios.add_parser("protocol", help="bytes and CPU per event, JSON vs compact")
+    wire.add_argument("--room", type=int, default=50, help="recipients per broadcast for the CPU comparison")
+    wire.add_argument("--storm", type=int, default=100, help="peers joining and leaving in the presence storm")
+
+    flood = scenarios.add_parser("flood", help="one peer floods chat; polite latency with and without limits")
+    flood.add_argument("--peers", type=int, default=10)
+    flood.add_argument("--messages", type=int, default=20)
+    flood.add_argument("--interval", type=float, default=0.25, help="polite peers stay under the chat policy")
+    flood.add_argument("--frames", type=int, default=5000, help="chat frames the abuser sends")
+
+    soak = scenarios.add_parser("soak", help="many meeting lifecycles; memory and state must stay flat")
+    soak.add_argument("--cycles", type=int, default=5000)
+    soak.add_argument("--peers", type=int, default=3)
+    soak.add_argument("--concurrency", type=int, default=25, help="meetings opened at once")
+    soak.add_argument("--ghost-every", type=int, default=10, help="every Nth meeting leaves a silent half-open peer (0 = none)")
+    soak.add_argument("--heartbeat", type=float, default=0.5, help="server heartbeat interval; timeout is 3x")
+    soak.add_argument("--warmup", type=int, default=200, help="cycles before the heap baseline (at most half of --cycles)")
+    soak.add_argument("--max-blocks-per-cycle", type=float, default=0.5, help="allowed growth in live server allocator blocks per cycle after warm-up")
+
+    scenarios.add_parser("serve", help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.scenario == "serve":
+        serve(args.port)
+        return
+
+    runner = {
+        "signaling": run_signaling,
+        "login-burst": run_login_burst,
+        "joins": run_joins,
+        "protocol": run_protocol,
+        "flood": run_flood,
+        "soak": run_soak,
+    }[args.scenario]
+    asyncio.run(runner(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,24 +3,41 @@ import multiprocessing
 from dotenv import load_dotenv
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, Response
 from pydantic import BaseModel
-from database import get_meetings_collection
+from database import get_meetings_collection, close_client
 from fastapi.middleware.cors import CORSMiddleware
 from auth import router as auth_router
 from datetime import datetime
-from signaling import signaling_router
-from pymongo import MongoClient
-from auth import get_current_user
+from signaling import signaling_router, broker, chat_store, reaper, claim_single_worker
+from auth import get_current_user, hash_executor
+from chat_history import history_router
+from indexes import bootstrap_indexes
 from models import MeetingSchema
 import logging
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pymongo.errors import DuplicateKeyError
+from metrics import registry, RequestTimingMiddleware
+from ratelimit import limiter
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    claim_single_worker()
+    await bootstrap_indexes()
+    await broker.start()
+    await chat_store.start()
+    await reaper.start()
+    yield
+    await reaper.stop()
+    await chat_store.stop()
+    await broker.stop()
+    hash_executor.shutdown(wait=False, cancel_futures=True)
+    close_client()
+
+app = FastAPI(lifespan=lifespan)
 router = APIRouter()
-MONGO_URI = os.getenv("DATABASE_URL")
-client = MongoClient(MONGO_URI)
 FRONTEND_URL = os.getenv("FRONTEND_URL", "https://streamlink-sigma.vercel.app")
 
 # ✅ Ensure `FRONTEND_URL` is correctly formatted (remove trailing slashes)
@@ -40,7 +57,9 @@ app.add_middleware(
     allow_headers=["Authorization", "Content-Type", "X-CSRF-Token"], # ✅ Allow all headers, including "Origin"
 )
 
-logging.basicConfig(level=logging.DEBUG)
+# ✅ DEBUG logs every chat message; keep production at INFO or above
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+app.add_middleware(RequestTimingMiddleware)
 
 class StartMeetingRequest(BaseModel):
     meeting_id: str
@@ -59,16 +78,22 @@ async def start_meeting(meeting: MeetingSchema, current_user: dict = Depends(get
     if not current_user:
         raise HTTPException(status_code=401, detail="User not authenticated")
     
-    existing_meeting = await meetings_collection.find_one({"meeting_id": meeting.meeting_id})
-    if existing_meeting:
+    # ✅ Create-if-absent in one round trip; the unique index settles races
+    try:
+        result = await meetings_collection.update_one(
+            {"meeting_id": meeting.meeting_id},
+            {"$setOnInsert": {
+                "meeting_id": meeting.meeting_id,
+                "host": current_user["username"],
+                "participants": [current_user["username"]],
+            }},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return {"message": "Meeting already exists", "meeting_id": meeting.meeting_id}
+
+    if result.upserted_id is None:
         return {"message": "Meeting already exists", "meeting_id": meeting.meeting_id}
-    
-    new_meeting = {
-        "meeting_id": meeting.meeting_id,
-        "host": current_user["username"],
-        "participants": [current_user["username"]],
-    }
-    await meetings_collection.insert_one(new_meeting)
 
     return {"message": "Meeting created", "meeting_id": meeting.meeting_id}
 
@@ -79,15 +104,16 @@ async def join_meeting(meeting: MeetingSchema, current_user: dict = Depends(get_
     if not current_user:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
-    existing_meeting = await meetings_collection.find_one({"meeting_id": meeting.meeting_id})
-    if not existing_meeting:
-        raise HTTPException(status_code=404, detail="Meeting not found")
+    # ✅ Throttle per account so one token cannot hammer the meetings collection
+    await limiter.enforce("http:/join-meeting", current_user["user_id"])
 
-    if current_user["username"] not in existing_meeting["participants"]:
-        await meetings_collection.update_one(
-            {"meeting_id": meeting.meeting_id},
-            {"$push": {"participants": current_user["username"]}}
-        )
+    # ✅ $addToSet keeps participants unique without reading the array back
+    result = await meetings_collection.update_one(
+        {"meeting_id": meeting.meeting_id},
+        {"$addToSet": {"participants": current_user["username"]}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Meeting not found")
 
     return {"message": "Joined meeting successfully", "meeting_id": meeting.meeting_id}
 
@@ -95,10 +121,16 @@ async def join_meeting(meeting: MeetingSchema, current_user: dict = Depends(get_
 def read_root():
     return {"message": "Backend is running!"}
 
+# ✅ async so it renders on the event loop, never beside handlers mutating room state
+@app.get("/metrics")
+async def read_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     multiprocessing.set_start_method("spawn")
 
 print("✅ Registering routers...")
 app.include_router(auth_router)  
 app.include_router(signaling_router)
+app.include_router(history_router)
 app.include_router(router)
@@ -0,0 +1,161 @@
+import os
+from operator import itemgetter
+from typing import Optional, Union
+import orjson
+
+# Wire formats a client can pick with `?protocol=` on the WebSocket URL
+JSON = "json"
+COMPACT = "compact"
+PROTOCOLS = (JSON, COMPACT)
+
+# Presence events compact clients receive coalesced into `roster-delta`
+PRESENCE_EVENTS = ("user-joined", "user-left")
+PRESENCE_BATCH_MS = int(os.getenv("PRESENCE_BATCH_MS", "50"))
+
+# Compact mode sends orjson bytes in binary frames with these short keys and
+# type codes. Keys not listed here are sent unchanged.
+COMPACT_KEYS = {
+    "type": "t",
+    "peerId": "p",
+    "peerIds": "ps",
+    "sender": "s",
+    "message": "m",
+    "messages": "ms",
+    "nextCursor": "c",
+    "joined": "j",
+    "left": "l",
+    "id": "i",
+    "timestamp": "ts",
+    "retryAfter": "ra",
+}
+COMPACT_TYPES = {
+    "chat-message": "cm",
+    "chat-history": "ch",
+    "user-joined": "uj",
+    "user-left": "ul",
+    "roster-delta": "rd",
+    "new-user": "nu",
+    "approval-request": "ar",
+    "approval-cancelled": "ac",
+    "approved": "ok",
+    "denied": "no",
+    "approve-all": "oa",
+    "deny-all": "na",
+    "rate-limited": "rl",
+    "admin-changed": "ad",
+    "ping": "pi",
+    "pong": "po",
+}
+EXPANDED_KEYS = {short: key for key, short in COMPACT_KEYS.items()}
+EXPANDED_TYPES = {short: kind for kind, short in COMPACT_TYPES.items()}
+
+# Fields of the frames the server sends, in wire order. Frames of exactly
+# this shape are built by a precomputed dict display instead of renaming
+# keys one by one, and chat-history messages go out as arrays in
+# HISTORY_ROW order.
+COMPACT_FIELDS = {
+    "chat-message": ("sender", "message"),
+    "chat-history": ("messages", "nextCursor"),
+    "user-joined": ("peerId",),
+    "user-left": ("peerId",),
+    "roster-delta": ("joined", "left"),
+    "approval-request": ("peerId",),
+    "approval-cancelled": ("peerId",),
+    "approved": (),
+    "rate-limited": ("retryAfter",),
+    "admin-changed": ("peerId",),
+    "ping": (),
+    "pong": (),
+}
+HISTORY_ROW = ("id", "sender", "message", "timestamp")
+
+
+def _shape(kind: str, fields: tuple):
+    """Build the short-key dict for a `kind` frame straight from its fields."""
+    code = COMPACT_TYPES[kind]
+    keys = [COMPACT_KEYS[field] for field in fields]
+    if not fields:
+        return lambda message: {"t": code}
+    if len(fields) == 1:
+        (field,), (key,) = fields, keys
+        return lambda message: {"t": code, key: message[field]}
+    (first, second), (first_key, second_key) = fields, keys
+    return lambda message: {"t": code, first_key: message[first], second_key: message[second]}
+
+
+_history_row = itemgetter(*HISTORY_ROW)
+_SHAPES = {kind: (_shape(kind, fields), len(fields) + 1) for kind, fields in COMPACT_FIELDS.items()}
+# History rows are the one nested shape; they become arrays on the way out
+_SHAPES["chat-history"] = (lambda message: {
+    "t": "ch", "ms": list(map(_history_row, message["messages"])), "c": message["nextCursor"]}, 3)
+
+
+def _rename(message: dict, keys: dict, types: dict) -> dict:
+    """Swap top-level keys and the type; nested values are the sender's own."""
+    renamed = {keys.get(key, key): item for key, item in message.items()}
+    kind = renamed.get(keys.get("type", "type"))
+    if isinstance(kind, str):
+        renamed[keys.get("type", "type")] = types.get(kind, kind)
+    return renamed
+
+
+def encode_compact(message: dict) -> bytes:
+    try:
+        build, size = _SHAPES[message["type"]]
+        if len(message) == size:
+            return orjson.dumps(build(message))
+    except (KeyError, TypeError):
+        pass  # Not a fixed shape after all; take the general path
+    return orjson.dumps(_rename(message, COMPACT_KEYS, COMPACT_TYPES))
+
+
+def decode(data: Union[str, bytes], protocol: str):
+    """Parse an inbound frame into the long-form message handlers expect.
+
+    Raises orjson.JSONDecodeError on malformed input.
+    """
+    message = orjson.loads(data)
+    if protocol == COMPACT and isinstance(message, dict):
+        message = _rename(message, EXPANDED_KEYS, EXPANDED_TYPES)
+        if message.get("type") == "chat-history" and isinstance(message.get("messages"), list):
+            message["messages"] = [dict(zip(HISTORY_ROW, row)) if isinstance(row, list) else row
+                                   for row in message["messages"]]
+    return message
+
+
+class Frame:
+    """One outbound event, encoded at most once per wire format.
+
+    A broadcast builds a single Frame and hands it to every recipient, so
+    each format is serialized once per event no matter how many peers use it.
+    """
+
+    __slots__ = ("_message", "_json", "_compact")
+
+    def __init__(self, message: Optional[dict] = None, json_payload: Optional[str] = None):
+        self._message = message
+        self._json = json_payload
+        self._compact: Optional[bytes] = None
+
+    @property
+    def message(self) -> dict:
+        if self._message is None:
+            self._message = orjson.loads(self._json)
+        return self._message
+
+    @property
+    def type(self) -> str:
+        return self.message.get("type", "")
+
+    def json(self) -> str:
+        if self._json is None:
+            self._json = orjson.dumps(self._message).decode()
+        return self._json
+
+    def compact(self) -> bytes:
+        if self._compact is None:
+            self._compact = encode_compact(self.message)
+        return self._compact
+
+    def encode(self, protocol: str) -> Union[str, bytes]:
+        return self.compact() if protocol == COMPACT else self.json()
@@ -0,0 +1,190 @@
+import os
+import math
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, Request
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from metrics import registry, Counter
+
+# "memory" keeps buckets per worker; "mongo" shares ip/user buckets across workers
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_BUCKET_TTL_SECONDS = int(os.getenv("RATE_LIMIT_BUCKET_TTL_SECONDS", "3600"))
+# Overrides as "name=capacity:per_second" pairs separated by ";",
+# e.g. "ws:chat-message=40:10;http:/token=5:0.1"
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+
+logger = logging.getLogger(__name__)
+rate_limited = registry.register(Counter(
+    "rate_limited_total", "Requests and frames rejected by the rate limiter.", ("policy",)))
+
+
+class RateLimitPolicy:
+    """A token bucket: `capacity` is the burst, refilled at `per_second`."""
+
+    def __init__(self, capacity: float, per_second: float):
+        self.capacity = capacity
+        self.per_second = per_second
+
+    def __repr__(self):
+        return f"RateLimitPolicy(capacity={self.capacity}, per_second={self.per_second})"
+
+
+# HTTP policies are named after the route, WebSocket ones after the frame type.
+# Per-IP limits (/token, /register, ws:connect) are sized for many users
+# behind one NAT or an untrusted proxy, not for a single client.
+DEFAULT_POLICIES: Dict[str, RateLimitPolicy] = {
+    "http:/token": RateLimitPolicy(100, 5),
+    "http:/register": RateLimitPolicy(30, 0.5),
+    "http:/join-meeting": RateLimitPolicy(30, 1),
+    "ws:connect": RateLimitPolicy(200, 20),
+    "ws:chat-message": RateLimitPolicy(20, 5),
+}
+
+
+def load_policies(overrides: str = RATE_LIMITS) -> Dict[str, RateLimitPolicy]:
+    policies = dict(DEFAULT_POLICIES)
+    for item in filter(None, (part.strip() for part in overrides.split(";"))):
+        try:
+            name, spec = item.split("=")
+            capacity, per_second = spec.split(":")
+            policies[name.strip()] = RateLimitPolicy(float(capacity), float(per_second))
+        except ValueError:
+            raise ValueError(f"❌ ERROR: Invalid RATE_LIMITS entry `{item}`")
+    return policies
+
+
+class InMemoryBucketStore:
+    """Buckets for this worker only, evicting the least recently used keys."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def hit(self, key: str, policy: RateLimitPolicy, cost: float = 1) -> Tuple[bool, float]:
+        return self.hit_now(key, policy, cost)
+
+    def hit_now(self, key: str, policy: RateLimitPolicy, cost: float = 1) -> Tuple[bool, float]:
+        """Synchronous variant for hot paths; returns (allowed, retry_after)."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (policy.capacity, now))
+        tokens = min(policy.capacity, tokens + (now - updated) * policy.per_second)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        retry_after = 0.0 if allowed else (cost - tokens) / policy.per_second
+        return allowed, retry_after
+
+
+class MongoBucketStore:
+    """Buckets shared by every worker, refilled atomically inside MongoDB.
+
+    One find_one_and_update per check computes the refill, the decision and
+    the decrement server-side, so concurrent workers never double-spend a
+    token. Stale buckets expire through a TTL index. If MongoDB is
+    unreachable the check fails open rather than locking users out.
+    """
+
+    def __init__(self, get_collection):
+        self.get_collection = get_collection
+        self._indexed = False
+
+    async def hit(self, key: str, policy: RateLimitPolicy, cost: float = 1) -> Tuple[bool, float]:
+        collection = self.get_collection()
+        now = datetime.utcnow()
+        try:
+            if not self._indexed:
+                await collection.create_index("updated", expireAfterSeconds=RATE_LIMIT_BUCKET_TTL_SECONDS)
+                self._indexed = True
+            elapsed = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, 1000]}
+            refilled = {"$min": [policy.capacity, {"$add": [
+                {"$ifNull": ["$tokens", policy.capacity]}, {"$multiply": [elapsed, policy.per_second]}]}]}
+            bucket = await collection.find_one_and_update(
+                {"_id": key},
+                [
+                    {"$set": {"tokens": refilled, "updated": now}},
+                    {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                    {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]}}},
+                ],
+                projection={"tokens": 1, "allowed": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except PyMongoError as e:
+            logger.warning("⚠️ Rate limit store unavailable, allowing key=%s error=%s", key, e)
+            return True, 0.0
+        if bucket["allowed"]:
+            return True, 0.0
+        return False, (cost - bucket["tokens"]) / policy.per_second
+
+
+class RateLimiter:
+    def __init__(self, shared_store, policies: Optional[Dict[str, RateLimitPolicy]] = None):
+        self.shared = shared_store
+        self.local = InMemoryBucketStore()
+        self.policies = policies if policies is not None else load_policies()
+
+    async def check(self, policy_name: str, key: str, shared: bool = True) -> Tuple[bool, float]:
+        """Spend one token from `key`'s bucket; unknown policies always pass."""
+        policy = self.policies.get(policy_name)
+        if policy is None:
+            return True, 0.0
+        store = self.shared if shared else self.local
+        allowed, retry_after = await store.hit(f"{policy_name}|{key}", policy)
+        if not allowed:
+            rate_limited.inc(policy_name)
+        return allowed, retry_after
+
+    def check_local(self, policy_name: str, key: str) -> Tuple[bool, float]:
+        """Per-connection check that never leaves the worker or awaits."""
+        policy = self.policies.get(policy_name)
+        if policy is None:
+            return True, 0.0
+        allowed, retry_after = self.local.hit_now(f"{policy_name}|{key}", policy)
+        if not allowed:
+            rate_limited.inc(policy_name)
+        return allowed, retry_after
+
+    async def enforce(self, policy_name: str, key: str):
+        """HTTP flavour of `check`: raises 429 with Retry-After when limited."""
+        allowed, retry_after = await self.check(policy_name, key)
+        if not allowed:
+            raise HTTPException(status_code=429, detail="Too many requests",
+                                headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+def create_limiter(backend: str = RATE_LIMIT_BACKEND) -> RateLimiter:
+    if backend == "memory":
+        return RateLimiter(InMemoryBucketStore())
+    if backend == "mongo":
+        from database import get_collection
+        return RateLimiter(MongoBucketStore(lambda: get_collection("rate_limits")))
+    raise ValueError(f"❌ ERROR: Unknown RATE_LIMIT_BACKEND `{backend}`")
+
+
+limiter = create_limiter()
+
+# uvicorn reads the same variable; without it every proxied request carries
+# the proxy's address and the per-IP buckets are shared service-wide
+if not os.getenv("FORWARDED_ALLOW_IPS"):
+    logger.warning("⚠️ FORWARDED_ALLOW_IPS is unset; per-IP rate limits key on the proxy address when behind one")
+
+
+def client_ip(request: Request) -> str:
+    # uvicorn rewrites `client` from X-Forwarded-For for trusted proxies
+    return request.client.host if request.client else "unknown"
+
+
+def limit_by_ip(policy_name: str):
+    """Route dependency limiting callers by client IP."""
+    async def dependency(request: Request):
+        await limiter.enforce(policy_name, client_ip(request))
+    return dependency
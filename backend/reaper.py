@@ -0,0 +1,90 @@
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+from connection import PeerConnection
+from metrics import registry, Counter
+from protocol import Frame
+
+HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("HEARTBEAT_INTERVAL_SECONDS", "20"))
+HEARTBEAT_TIMEOUT_SECONDS = float(os.getenv("HEARTBEAT_TIMEOUT_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+peers_reaped = registry.register(Counter(
+    "signaling_peers_reaped_total", "Peers evicted by the reaper.", ("reason",)))
+
+Stale = Tuple[str, str, PeerConnection, str]
+
+
+class ConnectionReaper:
+    """Heartbeats the peers on this worker and evicts the dead ones.
+
+    One task sweeps every room each `interval`: peers that have been quiet
+    for an interval get a `ping`, and a peer is handed to `evict` once its
+    writer has failed or, if it has ever answered a ping, once it has been
+    silent for `timeout`. `evict` returns whether it actually removed the
+    peer, since the handler's own cleanup may have got there first.
+    Clients that never pong are left to the server's transport-level
+    pings, so older frontends are not cut off while idle.
+    `on_sweep` runs after each pass for housekeeping of per-meeting state.
+    """
+
+    def __init__(self, broker, evict: Callable[[str, str, PeerConnection, str], Awaitable[bool]],
+                 on_sweep: Optional[Callable[[], None]] = None,
+                 interval: float = HEARTBEAT_INTERVAL_SECONDS, timeout: float = HEARTBEAT_TIMEOUT_SECONDS):
+        self.broker = broker
+        self.evict = evict
+        self.on_sweep = on_sweep
+        self.interval = interval
+        self.timeout = timeout
+        self._task: Optional[asyncio.Task] = None
+        self._ping = Frame({"type": "ping"})
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def sweep(self, now: float) -> List[Stale]:
+        """Ping idle peers and return the ones to evict."""
+        stale: List[Stale] = []
+        for meeting_id, room in self.broker.rooms.items():
+            for peer_id, connection in room.items():
+                idle = now - connection.last_seen
+                if connection.closed:
+                    stale.append((meeting_id, peer_id, connection, "send-failed"))
+                elif connection.heartbeat and idle > self.timeout:
+                    stale.append((meeting_id, peer_id, connection, "heartbeat"))
+                elif idle >= self.interval:
+                    connection.send(self._ping)
+        return stale
+
+    async def reap(self) -> int:
+        stale = self.sweep(asyncio.get_running_loop().time())
+        for meeting_id, peer_id, connection, reason in stale:
+            try:
+                if await self.evict(meeting_id, peer_id, connection, reason):
+                    peers_reaped.inc(reason)
+            except Exception:
+                logger.exception("❌ Failed to evict peer meeting=%s peer=%s", meeting_id, peer_id)
+        if self.on_sweep is not None:
+            self.on_sweep()
+        return len(stale)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                reaped = await self.reap()
+                if reaped:
+                    logger.info("🧹 Reaped %d stale peers", reaped)
+            except Exception:
+                logger.exception("❌ Reaper sweep failed")
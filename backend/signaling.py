@@ -1,55 +1,285 @@
 import os
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Dict, List
-from database import chat_collection  # ✅ Import MongoDB collection
+import fcntl
+import asyncio
+import logging
+import tempfile
+import orjson
+from collections import deque
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from pymongo.errors import PyMongoError
+from typing import Dict, Optional, Tuple
+from database import get_chat_collection
 from models import ChatMessage
 from datetime import datetime
+from broker import create_broker
+from connection import PeerConnection
+from chat_store import ChatWriteBehind
+from auth import get_current_user
+from chat_history import fetch_history, is_participant, HISTORY_MAX_LIMIT
+from admission import AdmissionRegistry, ADMISSION_TIMEOUT_SECONDS, APPROVED, DENIED
+from metrics import registry
+from protocol import Frame, PROTOCOLS, JSON, decode
+from ratelimit import limiter
+from reaper import ConnectionReaper
 
 signaling_router = APIRouter()
 WEBSOCKET_HOST = os.getenv("WEBSOCKET_HOST")
 WEBSOCKET_PORT = int(os.getenv("WEBSOCKET_PORT"))
 
-# Active meetings and participants
-active_meetings: Dict[str, Dict[str, WebSocket]] = {}
-pending_users: Dict[str, List[str]] = {}  # Users waiting for approval
+# Admin election and the waiting room below live in this process only; a
+# second worker would elect its own admin and let its peers skip admission.
+# Every worker locks this file at startup, so `uvicorn --workers N`,
+# gunicorn `-w N` and WEB_CONCURRENCY alike fail instead of serving.
+SIGNALING_LOCK_FILE = os.getenv(
+    "SIGNALING_LOCK_FILE", os.path.join(tempfile.gettempdir(), f"signaling-{WEBSOCKET_PORT}.lock"))
+_worker_lock = None
+
+# Room fan-out; `active_meetings` holds the peers connected to this worker
+broker = create_broker()
+active_meetings: Dict[str, Dict[str, PeerConnection]] = broker.rooms
+chat_store = ChatWriteBehind(get_chat_collection)
+pending_users = AdmissionRegistry()  # Users waiting for approval
 meeting_admins: Dict[str, str] = {}  # Admin for each meeting
+logger = logging.getLogger(__name__)
+
+registry.gauge("signaling_active_meetings", "Meetings with at least one peer on this worker.",
+               lambda: len(active_meetings))
+registry.gauge("signaling_active_peers", "Admitted peers connected to this worker.",
+               lambda: sum(len(room) for room in active_meetings.values()))
+registry.gauge("signaling_pending_admissions", "Peers waiting for host approval.",
+               lambda: sum(len(queue) for queue in pending_users.meetings.values()))
+registry.gauge("signaling_tracked_meetings", "Meetings with an admin assigned on this worker.",
+               lambda: len(meeting_admins))
+registry.gauge("chat_write_queue_depth", "Chat messages waiting to be persisted.",
+               lambda: chat_store.queue_depth)
+registry.gauge("chat_write_last_flush_seconds", "Duration of the latest chat insert_many.",
+               lambda: chat_store.last_flush_seconds)
+registry.gauge("chat_messages_persisted_total", "Chat messages written to MongoDB.",
+               lambda: chat_store.persisted, kind="counter")
+registry.gauge("chat_messages_dropped_total", "Chat messages dropped by the write-behind buffer.",
+               lambda: chat_store.dropped, kind="counter")
+
+# Close codes for peers that never make it out of the waiting room
+ADMISSION_DENIED_CLOSE_CODE = 4403
+ADMISSION_TIMEOUT_CLOSE_CODE = 4408
+TIMED_OUT = "timed-out"
+
+# Flood control: connects are limited per IP, frames per peer and frame type
+# (policies named "ws:<type>" in ratelimit.py). Rejected frames get a
+# `rate-limited` reply; a peer rejected more than RATE_LIMIT_MAX_STRIKES
+# times within RATE_LIMIT_STRIKE_WINDOW_SECONDS is disconnected.
+RATE_LIMITED_CLOSE_CODE = 4429
+POLICY_VIOLATION_CLOSE_CODE = 1008
+RATE_LIMIT_MAX_STRIKES = int(os.getenv("RATE_LIMIT_MAX_STRIKES", "50"))
+RATE_LIMIT_STRIKE_WINDOW_SECONDS = float(os.getenv("RATE_LIMIT_STRIKE_WINDOW_SECONDS", "10"))
+
+# Sent to peers the reaper evicts (dead writer or missed heartbeats)
+STALE_PEER_CLOSE_CODE = 4410
+
+# Admin frames that settle the waiting room; the *-all forms take an
+# optional `peerIds` list and otherwise apply to everyone waiting
+ADMISSION_DECISIONS = {
+    "approved": APPROVED,
+    "denied": DENIED,
+    "approve-all": APPROVED,
+    "deny-all": DENIED,
+}
+
+
+async def wait_for_admission(websocket: WebSocket, decision: asyncio.Future) -> Tuple[Optional[str], Optional[asyncio.Task]]:
+    """Sleep until the admin decides; the outcome is None if the peer left first.
+
+    Frames a waiting peer sends (e.g. "new-user") are dropped. The receive
+    still in flight when the wait ends is returned instead of cancelled:
+    uvicorn refuses a new receive while a cancelled one is outstanding, so
+    the caller has to consume it (or give up on the socket).
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + ADMISSION_TIMEOUT_SECONDS
+    receive = asyncio.create_task(websocket.receive())
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return TIMED_OUT, receive
+        done, _ = await asyncio.wait({decision, receive}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        if decision in done:
+            return (None if decision.cancelled() else decision.result()), receive
+        if receive in done:
+            if receive.result()["type"] == "websocket.disconnect":
+                return None, None
+            receive = asyncio.create_task(websocket.receive())
+
+
+async def hand_off_admin(meeting_id: str):
+    """Promote the longest-connected local peer and replay the waiting room to it."""
+    room = broker.local_peers(meeting_id)
+    successor = next(iter(room))
+    meeting_admins[meeting_id] = successor
+    await broker.publish(meeting_id, {"type": "admin-changed", "peerId": successor})
+    for pending_id in pending_users.pending_ids(meeting_id):
+        room[successor].send(Frame({"type": "approval-request", "peerId": pending_id}))
+
+
+async def release_peer(meeting_id: str, peer_id: str, connection: PeerConnection) -> bool:
+    """Remove an admitted peer and everything the meeting no longer needs.
+
+    Safe to call twice (handler `finally` and the reaper can race) and a
+    no-op if a newer socket has since joined under the same peer id.
+    """
+    if broker.local_peers(meeting_id).get(peer_id) is not connection:
+        return False
+    await broker.leave(meeting_id, peer_id)
+    await broker.publish(meeting_id, {"type": "user-left", "peerId": peer_id})
+    if not broker.local_peers(meeting_id):
+        # Meeting emptied; whoever connects next hosts it and gets the
+        # waiting room replayed. Waiters are never admitted without a host
+        # and time out if nobody comes back.
+        meeting_admins.pop(meeting_id, None)
+    elif meeting_admins.get(meeting_id) == peer_id:
+        await hand_off_admin(meeting_id)
+    return True
+
+
+async def evict_peer(meeting_id: str, peer_id: str, connection: PeerConnection, reason: str) -> bool:
+    logger.info("🧹 Evicting peer meeting=%s peer=%s reason=%s", meeting_id, peer_id, reason)
+    connection.disconnect(STALE_PEER_CLOSE_CODE)
+    return await release_peer(meeting_id, peer_id, connection)
+
+
+async def replay_history(connection: PeerConnection, meeting_id: str, token: Optional[str], limit: int):
+    """Send recent chat to a peer whose token belongs to a meeting participant.
+
+    Admission alone proves nothing (the first socket into an empty meeting
+    hosts it), so anything else gets no replay rather than an error.
+    """
+    if not token:
+        return
+    try:
+        user = await get_current_user(token)
+        if not await is_participant(meeting_id, user["username"]):
+            return
+        await chat_store.flush()
+        page = await fetch_history(meeting_id, limit=min(limit, HISTORY_MAX_LIMIT))
+    except HTTPException:
+        return  # Invalid or expired token
+    except PyMongoError as e:
+        logger.warning("⚠️ Skipping chat replay meeting=%s error=%s", meeting_id, e)
+        return
+    connection.send(Frame({"type": "chat-history", **page}))
+
+
+def claim_single_worker():
+    """Hold the signaling lock for this process's lifetime, or refuse to start."""
+    global _worker_lock
+    lock = open(SIGNALING_LOCK_FILE, "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        raise RuntimeError(f"❌ ERROR: Another signaling worker holds `{SIGNALING_LOCK_FILE}`; "
+                           "meeting admins and the waiting room are per-process, run a single worker")
+    _worker_lock = lock
+
+
+def forget_idle_meetings():
+    """Drop admin entries for meetings with no local peers and nobody waiting."""
+    for meeting_id in [m for m in meeting_admins if m not in active_meetings and pending_users.get(m) is None]:
+        del meeting_admins[meeting_id]
+
+
+reaper = ConnectionReaper(broker, evict_peer, on_sweep=forget_idle_meetings)
+
 
 @signaling_router.websocket("/ws/{meeting_id}/{peer_id}")
-async def websocket_endpoint(websocket: WebSocket, meeting_id: str, peer_id: str):
+async def websocket_endpoint(websocket: WebSocket, meeting_id: str, peer_id: str, history: int = 0,
+                             token: Optional[str] = None, protocol: str = JSON):
     await websocket.accept()
+    client_ip = websocket.client.host if websocket.client else "unknown"
+    allowed, _ = await limiter.check("ws:connect", client_ip)
+    if not allowed:
+        await websocket.close(code=RATE_LIMITED_CLOSE_CODE, reason="Too many connections")
+        return
+    # ✅ `?protocol=compact` opts into short-key binary frames; JSON stays the default
+    if protocol not in PROTOCOLS:
+        protocol = JSON
     
     # Assign first user as admin
     if meeting_id not in meeting_admins:
         meeting_admins[meeting_id] = peer_id
-        active_meetings[meeting_id] = {}  
-
-    is_admin = meeting_admins[meeting_id] == peer_id
 
-    if not is_admin:
-        if meeting_id not in pending_users:
-            pending_users[meeting_id] = []
-        pending_users[meeting_id].append(peer_id)
+    waited = meeting_admins[meeting_id] != peer_id
+    connection: Optional[PeerConnection] = None
+    pending_receive: Optional[asyncio.Task] = None
 
-        admin_id = meeting_admins[meeting_id]
-        admin_ws = active_meetings[meeting_id].get(admin_id)
+    try:
+        if waited:
+            decision = pending_users.request(meeting_id, peer_id)
+            await broker.publish(meeting_id, {"type": "approval-request", "peerId": peer_id}, to=meeting_admins[meeting_id])
 
-        if admin_ws:
-            await admin_ws.send_json({"type": "approval-request", "peerId": peer_id})
+            outcome, pending_receive = await wait_for_admission(websocket, decision)
+            if outcome != APPROVED:
+                if outcome == DENIED:
+                    await websocket.close(code=ADMISSION_DENIED_CLOSE_CODE, reason="Denied by host")
+                elif outcome == TIMED_OUT:
+                    await websocket.close(code=ADMISSION_TIMEOUT_CLOSE_CODE, reason="Approval timed out")
+                return
 
-        while peer_id in pending_users[meeting_id]:
-            message = await websocket.receive_text()
-            if message == "approved":
-                pending_users[meeting_id].remove(peer_id)
+        connection = broker.join(meeting_id, peer_id, websocket, protocol=protocol)
+        if waited:
+            connection.send(Frame({"type": "approved"}))
+        await broker.publish(meeting_id, {"type": "user-joined", "peerId": peer_id}, exclude=peer_id)
 
-    active_meetings[meeting_id][peer_id] = websocket
+        # ✅ Replay approval requests that arrived before the admin connected
+        # (or before the room emptied and this peer inherited it)
+        if meeting_admins.setdefault(meeting_id, peer_id) == peer_id:
+            if waited:
+                connection.send(Frame({"type": "admin-changed", "peerId": peer_id}))
+            for pending_id in pending_users.pending_ids(meeting_id):
+                connection.send(Frame({"type": "approval-request", "peerId": pending_id}))
 
-    for connection in active_meetings[meeting_id].values():
-        if connection != websocket:
-            await connection.send_json({"type": "user-joined", "peerId": peer_id})
+        # ✅ Replay recent chat for late joiners that asked for it
+        # (`?history=N&token=<access token>`); participants only
+        if history > 0:
+            await replay_history(connection, meeting_id, token, history)
 
-    try:
+        loop = asyncio.get_running_loop()
+        strikes: deque = deque()  # Loop times of recent rejections, oldest first
         while True:
-            data = await websocket.receive_json()
+            if pending_receive is not None:
+                frame = await pending_receive
+                pending_receive = None
+            else:
+                frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            connection.last_seen = loop.time()
+            try:
+                data = decode(frame["text"] if frame.get("text") is not None else frame["bytes"], protocol)
+            except orjson.JSONDecodeError:
+                continue  # Malformed frames are ignored like any other junk
+
+            if not isinstance(data, dict) or not isinstance(data.get("type"), str):
+                continue
+
+            # ✅ Heartbeat replies only refresh `last_seen`
+            if data["type"] == "pong":
+                connection.heartbeat = True
+                continue
+
+            # ✅ Spend a token before any broadcast or insert happens
+            allowed, retry_after = limiter.check_local(f"ws:{data['type']}", f"{meeting_id}/{peer_id}")
+            if not allowed:
+                # Only a sustained flood counts; an occasional burst ages out
+                now = loop.time()
+                strikes.append(now)
+                while strikes[0] < now - RATE_LIMIT_STRIKE_WINDOW_SECONDS:
+                    strikes.popleft()
+                if len(strikes) > RATE_LIMIT_MAX_STRIKES:
+                    logger.warning("⚠️ Disconnecting flooding peer meeting=%s peer=%s", meeting_id, peer_id)
+                    await websocket.close(code=POLICY_VIOLATION_CLOSE_CODE, reason="Rate limit exceeded")
+                    raise WebSocketDisconnect(POLICY_VIOLATION_CLOSE_CODE)
+                connection.send(Frame({"type": "rate-limited", "retryAfter": round(retry_after, 3)}))
+                continue
 
             # Handle Chat Messages
             if data["type"] == "chat-message":
@@ -63,27 +293,52 @@ async def websocket_endpoint(websocket: WebSocket, meeting_id: str, peer_id: str
                     timestamp=datetime.utcnow()
                 )
 
-                try:
-                    # ✅ Store in MongoDB
-                    result = await chat_collection.insert_one(chat_msg.dict())
-                    print(f"✅ Chat message saved with ID: {result.inserted_id}")
-                except Exception as e:
-                    print(f"❌ Error saving chat message: {e}")
-
                 # ✅ Broadcast message to all meeting participants
-                for connection in active_meetings.get(meeting_id, {}).values():
-                    try:
-                        await connection.send_json({
-                            "type": "chat-message",
-                            "sender": sender,
-                            "message": message
-                        })
-                        print(f"📩 Message sent to {connection}")
-                    except Exception as e:
-                        print(f"❌ Error sending message: {e}")
+                await broker.publish(meeting_id, {
+                    "type": "chat-message",
+                    "sender": sender,
+                    "message": message
+                })
+
+                # ✅ Store in MongoDB once the room has the message
+                chat_store.enqueue(chat_msg.dict())
+
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("📩 chat-message meeting=%s sender=%s recipients=%d",
+                                 meeting_id, sender, len(active_meetings.get(meeting_id, {})))
+
+            # Handle the admin's waiting-room decisions (the admin may have changed)
+            elif data["type"] in ADMISSION_DECISIONS and meeting_admins.get(meeting_id) == peer_id:
+                if data["type"].endswith("-all"):
+                    peer_ids = data.get("peerIds")
+                    # Absent means everyone waiting; anything else must be a list of ids
+                    if peer_ids is not None and not (
+                            isinstance(peer_ids, list) and all(isinstance(p, str) for p in peer_ids)):
+                        continue
+                else:
+                    if not isinstance(data.get("peerId"), str):
+                        continue
+                    peer_ids = [data["peerId"]]
+                pending_users.resolve_many(meeting_id, peer_ids, ADMISSION_DECISIONS[data["type"]])
 
+            elif data["type"] == "ping":
+                connection.send(Frame({"type": "pong"}))
 
     except WebSocketDisconnect:
-        del active_meetings[meeting_id][peer_id]
-        for connection in active_meetings[meeting_id].values():
-            await connection.send_json({"type": "user-left", "peerId": peer_id})
+        pass
+    except Exception:
+        logger.exception("❌ Signaling handler failed meeting=%s peer=%s", meeting_id, peer_id)
+    finally:
+        # ✅ Runs for disconnects, errors and cancellation alike
+        if pending_receive is not None:
+            pending_receive.cancel()
+        if connection is not None:
+            await release_peer(meeting_id, peer_id, connection)
+        elif pending_users.cancel(meeting_id, peer_id):
+            # Left or timed out while waiting; let the admin drop the request
+            admin_id = meeting_admins.get(meeting_id)
+            if admin_id is not None:
+                await broker.publish(meeting_id, {"type": "approval-cancelled", "peerId": peer_id}, to=admin_id)
+        if meeting_admins.get(meeting_id) == peer_id and meeting_id not in active_meetings:
+            # Admin never made it into the room
+            meeting_admins.pop(meeting_id, None)
@@ -1,2 +1,9 @@
 #!/bin/bash
-uvicorn main:app --host 0.0.0.0 --port $PORT
+# One worker only: meeting admins and the waiting room are per-process, and
+# every worker takes signaling.py's startup lock, so extra workers fail.
+# Per-IP limits key on the proxy's address unless FORWARDED_ALLOW_IPS trusts it.
+if [ "${WEB_CONCURRENCY:-1}" -gt 1 ]; then
+    echo "❌ ERROR: WEB_CONCURRENCY must be 1 (admission state is per-process)" >&2
+    exit 1
+fi
+uvicorn main:app --host 0.0.0.0 --port $PORT --workers 1 --forwarded-allow-ips "${FORWARDED_ALLOW_IPS:-127.0.0.1}"
@@ -0,0 +1,71 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from metrics import registry
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+
+class UserCache:
+    """Bounded LRU of resolved users keyed by user id.
+
+    An entry lives for at most `ttl` seconds and never past the `exp` of the
+    token that loaded it. Anything that modifies a user document must call
+    `invalidate` so this worker stops serving the old copy.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: int = USER_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> Optional[dict]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return dict(user)
+
+    def set(self, user_id: str, user: dict, token_exp: Optional[float] = None):
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        self._entries[user_id] = (dict(user), expires_at)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+user_cache = UserCache()
+
+registry.gauge("auth_user_cache_hits_total", "get_current_user lookups served from cache.",
+               lambda: user_cache.hits, kind="counter")
+registry.gauge("auth_user_cache_misses_total", "get_current_user lookups that went to MongoDB.",
+               lambda: user_cache.misses, kind="counter")
+registry.gauge("auth_user_cache_size", "Users currently cached.", lambda: len(user_cache._entries))
@@ -69,6 +69,9 @@ const MeetingPage = () => {
             callUser(data.peerId);
           }
           break;
+        case "ping":
+          newSocket.send(JSON.stringify({ type: "pong" }));  // ✅ Keeps the server's reaper away
+          break;
         default:
           console.warn("⚠️ Unknown WebSocket Event:", data);
       }
@@ -93,6 +96,9 @@ const MeetingPage = () => {
     if (!socket || !peer) return;
     socket.onmessage = (event) => {
       const data = JSON.parse(event.data);
+      if (data.type === "ping") {
+        socket.send(JSON.stringify({ type: "pong" }));
+      }
       if (data.type === "approval-request" && isAdmin) {
         setPendingUsers((prev) => [...prev, data.peerId]);
       }